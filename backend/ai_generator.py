@@ -1,11 +1,58 @@
 import anthropic
-from typing import List, Optional, Dict, Any
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Iterator
+
+# Shared clients keyed by API key so every AIGenerator reuses one connection pool
+_CLIENT_CACHE: Dict[str, anthropic.Anthropic] = {}
+_ASYNC_CLIENT_CACHE: Dict[str, anthropic.AsyncAnthropic] = {}
+
+
+def _get_client(api_key: str) -> anthropic.Anthropic:
+    """Return the shared Anthropic client for an API key, creating it on first use"""
+    client = _CLIENT_CACHE.get(api_key)
+    if client is None:
+        client = _CLIENT_CACHE[api_key] = anthropic.Anthropic(api_key=api_key)
+    return client
+
+
+def _get_async_client(api_key: str) -> anthropic.AsyncAnthropic:
+    """Return the shared AsyncAnthropic client for an API key, creating it on first use"""
+    client = _ASYNC_CLIENT_CACHE.get(api_key)
+    if client is None:
+        client = _ASYNC_CLIENT_CACHE[api_key] = anthropic.AsyncAnthropic(api_key=api_key)
+    return client
 
 class AIGenerator:
     """Handles interactions with Anthropic's Claude API for generating responses"""
 
     MAX_TOOL_ROUNDS = 2
 
+    # Shared tool_choice payload; never mutated, so one instance serves every call
+    _TOOL_CHOICE_AUTO = {"type": "auto"}
+
+    # Seconds between status checks while a message batch is processing
+    BATCH_POLL_INTERVAL = 5
+
+    # Seconds generate_batch waits for a batch to end before cancelling it
+    BATCH_MAX_WAIT = 60 * 60
+
+    # Maximum number of responses kept by the per-instance LRU response cache
+    RESPONSE_CACHE_SIZE = 256
+
+    # Yielded by stream_response between a tool-calling turn's text and the next turn's
+    STREAM_TURN_SEPARATOR = "\n\n"
+
+    FALLBACK_RESPONSE = "I wasn't able to complete my analysis. Please try rephrasing your question."
+
+    # Prefix for the per-call history block; only the history itself is concatenated per call
+    _HISTORY_HEADER = "Previous conversation:\n"
+
     # Static system prompt to avoid rebuilding on each call
     SYSTEM_PROMPT = """ You are an AI assistant specialized in course materials and educational content with access to two tools:
 
@@ -36,10 +83,17 @@ All responses must be:
 Provide only the direct answer to what was asked.
 """
 
-    def __init__(self, api_key: str, model: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    def __init__(self, api_key: str, model: str, cache_responses: bool = True):
+        self.client = _get_client(api_key)
+        self.aclient = _get_async_client(api_key)
         self.model = model
 
+        # Static system prompt as a cacheable content block so repeat calls
+        # (including follow-ups inside the tool loop) hit Anthropic's prompt cache
+        self._system_block = [
+            {"type": "text", "text": self.SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+        ]
+
         # Pre-build base API parameters
         self.base_params = {
             "model": self.model,
@@ -47,6 +101,10 @@ Provide only the direct answer to what was asked.
             "max_tokens": 800
         }
 
+        # With temperature 0, identical tool-free requests give identical answers
+        self._response_cache: Optional[OrderedDict] = OrderedDict() if cache_responses else None
+        self._response_cache_lock = threading.Lock()
+
     def generate_response(self, query: str,
                          conversation_history: Optional[str] = None,
                          tools: Optional[List] = None,
@@ -64,26 +122,12 @@ Provide only the direct answer to what was asked.
         Returns:
             Generated response as string
         """
+        cache_key = self._response_cache_key(query, conversation_history, tools, tool_manager)
+        cached = self._get_cached_response(cache_key)
+        if cached is not None:
+            return cached
 
-        # Build system content efficiently - avoid string ops when possible
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history
-            else self.SYSTEM_PROMPT
-        )
-
-        # Prepare API call parameters
-        messages = [{"role": "user", "content": query}]
-        api_params = {
-            **self.base_params,
-            "messages": messages,
-            "system": system_content
-        }
-
-        # Add tools if available
-        if tools:
-            api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
+        api_params = self._build_api_params(query, conversation_history, tools)
 
         # Initial API call
         response = self.client.messages.create(**api_params)
@@ -97,21 +141,249 @@ Provide only the direct answer to what was asked.
             if not tool_results:
                 break
 
-            messages.append({"role": "assistant", "content": response.content})
-            messages.append({"role": "user", "content": tool_results})
-            api_params["messages"] = messages
+            self._append_tool_round(api_params, response, tool_results)
 
             response = self.client.messages.create(**api_params)
 
-        # Extract text from the final response
-        for block in response.content:
-            if hasattr(block, "text"):
-                return block.text
-        return "I wasn't able to complete my analysis. Please try rephrasing your question."
+        return self._cache_response(cache_key, self._extract_text(response))
+
+    def stream_response(self, query: str,
+                        conversation_history: Optional[str] = None,
+                        tools: Optional[List] = None,
+                        tool_manager=None) -> Iterator[str]:
+        """
+        Streaming variant of generate_response that yields text as it arrives.
+        Each API call is streamed; when a call ends in tool_use the tools are
+        executed and the loop continues, so any call can turn out to be the
+        final one without waiting for it to finish first.
+
+        Unlike generate_response, which returns only the final turn's text,
+        text Claude writes ahead of a tool call (e.g. "Let me search...") has
+        already been yielded by the time the tool_use arrives. It is kept and
+        separated from the next turn's text by STREAM_TURN_SEPARATOR.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+
+        Yields:
+            Response text chunks
+        """
+        api_params = self._build_api_params(query, conversation_history, tools)
+
+        separator = ""
+        for round_num in range(self.MAX_TOOL_ROUNDS + 1):
+            turn_has_text = False
+            with self.client.messages.stream(**api_params) as stream:
+                for text in stream.text_stream:
+                    # Keep an earlier turn's preamble from running into this turn's text
+                    if separator:
+                        yield separator
+                        separator = ""
+                    turn_has_text = True
+                    yield text
+                response = stream.get_final_message()
+
+            if (round_num == self.MAX_TOOL_ROUNDS
+                    or response.stop_reason != "tool_use" or not tool_manager):
+                return
+
+            tool_results = self._execute_tool_calls(response, tool_manager)
+            if not tool_results:
+                return
+
+            self._append_tool_round(api_params, response, tool_results)
+            if turn_has_text:
+                separator = self.STREAM_TURN_SEPARATOR
+
+    def generate_batch(self, queries: List[str],
+                       tools: Optional[List] = None,
+                       tool_manager=None,
+                       max_wait: Optional[float] = None) -> List[str]:
+        """
+        Generate responses for many independent queries at once.
+
+        Without a tool_manager the queries are submitted together through the
+        Message Batches API and polled until the batch ends, or cancelled once
+        max_wait seconds pass without it ending. Batches can't do
+        tool round-trips, so with a tool_manager each query instead runs through
+        generate_response on a thread pool, against its own fork of the manager
+        so the caller's tracked sources are left untouched.
+
+        Args:
+            queries: Independent user questions, no conversation history
+            tools: Available tools the AI can use (tool_manager path only)
+            tool_manager: Manager to execute tools
+            max_wait: Seconds to wait for the batch, defaults to BATCH_MAX_WAIT
+
+        Returns:
+            One response string per query, in input order
+
+        Raises:
+            TimeoutError: If the batch hasn't ended within max_wait; it is cancelled
+        """
+        if not queries:
+            return []
+
+        if tool_manager:
+            with ThreadPoolExecutor() as executor:
+                return list(executor.map(
+                    lambda query: self.generate_response(
+                        query, tools=tools, tool_manager=tool_manager.fork()
+                    ),
+                    queries,
+                ))
+
+        requests = [
+            {"custom_id": str(i), "params": self._build_api_params(query, None, None)}
+            for i, query in enumerate(queries)
+        ]
+        batch = self.client.messages.batches.create(requests=requests)
+        deadline = time.monotonic() + (self.BATCH_MAX_WAIT if max_wait is None else max_wait)
+        while batch.processing_status != "ended":
+            if time.monotonic() >= deadline:
+                self.client.messages.batches.cancel(batch.id)
+                raise TimeoutError(f"Message batch {batch.id} did not end within the wait limit")
+            time.sleep(self.BATCH_POLL_INTERVAL)
+            batch = self.client.messages.batches.retrieve(batch.id)
+
+        # Results arrive in arbitrary order; errored or expired entries keep the fallback
+        responses = [self.FALLBACK_RESPONSE] * len(queries)
+        for entry in self.client.messages.batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                responses[int(entry.custom_id)] = self._extract_text(entry.result.message)
+        return responses
+
+    async def agenerate_response(self, query: str,
+                                 conversation_history: Optional[str] = None,
+                                 tools: Optional[List] = None,
+                                 tool_manager=None) -> str:
+        """
+        Async variant of generate_response that awaits each API round so the
+        event loop stays free while Claude is generating.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+
+        Returns:
+            Generated response as string
+        """
+        cache_key = self._response_cache_key(query, conversation_history, tools, tool_manager)
+        cached = self._get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+
+        api_params = self._build_api_params(query, conversation_history, tools)
+
+        response = await self.aclient.messages.create(**api_params)
+
+        for round_num in range(self.MAX_TOOL_ROUNDS):
+            if response.stop_reason != "tool_use" or not tool_manager:
+                break
+
+            tool_results = await self._aexecute_tool_calls(response, tool_manager)
+            if not tool_results:
+                break
+
+            self._append_tool_round(api_params, response, tool_results)
+
+            response = await self.aclient.messages.create(**api_params)
+
+        return self._cache_response(cache_key, self._extract_text(response))
+
+    def _response_cache_key(self, query: str,
+                            conversation_history: Optional[str],
+                            tools: Optional[List],
+                            tool_manager) -> Optional[str]:
+        """Hash the request inputs, or return None when the response must not be cached"""
+        # Tool results depend on external state, so tool-driven responses are never cached
+        if self._response_cache is None or tool_manager is not None:
+            return None
+        payload = json.dumps([query, conversation_history, tools], sort_keys=True)
+        return hashlib.blake2b(payload.encode()).hexdigest()
+
+    def _get_cached_response(self, cache_key: Optional[str]) -> Optional[str]:
+        """Return a cached response and mark it recently used"""
+        if cache_key is None:
+            return None
+        with self._response_cache_lock:
+            response = self._response_cache.get(cache_key)
+            if response is not None:
+                self._response_cache.move_to_end(cache_key)
+            return response
+
+    def _cache_response(self, cache_key: Optional[str], response: str) -> str:
+        """Store a response, evicting the least recently used entry when full"""
+        if cache_key is not None:
+            with self._response_cache_lock:
+                self._response_cache[cache_key] = response
+                if len(self._response_cache) > self.RESPONSE_CACHE_SIZE:
+                    self._response_cache.popitem(last=False)
+        return response
+
+    def _build_api_params(self, query: str,
+                          conversation_history: Optional[str],
+                          tools: Optional[List]) -> Dict[str, Any]:
+        """Assemble messages.create() parameters for the first API call"""
+        # History rides in the first user turn so the system prompt stays
+        # byte-identical across every conversation and remains a shared cache hit
+        user_content = (
+            [
+                {"type": "text", "text": self._HISTORY_HEADER + conversation_history},
+                {"type": "text", "text": query},
+            ]
+            if conversation_history
+            else query
+        )
+
+        api_params = {
+            **self.base_params,
+            "messages": [{"role": "user", "content": user_content}],
+            "system": self._system_block
+        }
+
+        # Add tools if available
+        if tools:
+            api_params["tools"] = tools
+            api_params["tool_choice"] = self._TOOL_CHOICE_AUTO
+
+        return api_params
+
+    def _append_tool_round(self, api_params: Dict[str, Any], response,
+                           tool_results: list):
+        """Append an assistant tool_use turn and its results ahead of the next API call"""
+        messages = api_params["messages"]
+
+        # Move the cache breakpoint to the newest tool result so the next call
+        # reuses the prefix from this one without exceeding the breakpoint limit.
+        # tool_choice stays auto on the final call, since changing it would invalidate
+        # that cached prefix; a tool_use Claude still asks for then is ignored by the
+        # callers' round limit, leaving its text or the fallback.
+        if len(messages) > 1:
+            messages[-1]["content"][-1].pop("cache_control", None)
+        tool_results[-1]["cache_control"] = {"type": "ephemeral"}
+
+        messages.append({"role": "assistant", "content": response.content})
+        messages.append({"role": "user", "content": tool_results})
+
+    def _extract_text(self, response) -> str:
+        """Return the first text block of a response, or a fallback message"""
+        return next(
+            (block.text for block in response.content if block.type == "text"),
+            self.FALLBACK_RESPONSE,
+        )
 
     def _execute_tool_calls(self, response, tool_manager) -> list:
         """
         Execute all tool_use blocks in a response.
+        Different tools run concurrently; repeated calls to one tool run in
+        block order, since tools like CourseSearchTool track per-call state.
+        Results keep the original block order.
 
         Args:
             response: The API response containing tool_use blocks
@@ -120,13 +392,71 @@ Provide only the direct answer to what was asked.
         Returns:
             List of tool_result dicts, empty if no tool_use blocks found
         """
-        tool_results = []
-        for block in response.content:
-            if block.type == "tool_use":
-                result = tool_manager.execute_tool(block.name, **block.input)
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": block.id,
-                    "content": result
-                })
-        return tool_results
\ No newline at end of file
+        blocks = self._tool_use_blocks(response)
+        if not blocks:
+            return []
+
+        results = [None] * len(blocks)
+        groups = self._group_by_tool(blocks)
+
+        # A single tool doesn't need a thread pool
+        if len(groups) == 1:
+            self._run_tool_group(tool_manager, blocks, groups[0], results)
+        else:
+            with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+                futures = [
+                    executor.submit(self._run_tool_group, tool_manager, blocks, group, results)
+                    for group in groups
+                ]
+                for future in futures:
+                    future.result()
+
+        return self._build_tool_results(blocks, results)
+
+    async def _aexecute_tool_calls(self, response, tool_manager) -> list:
+        """
+        Async variant of _execute_tool_calls. Tools are synchronous, so each
+        tool's calls run in a worker thread and the threads are gathered.
+
+        Args:
+            response: The API response containing tool_use blocks
+            tool_manager: Manager to execute tools
+
+        Returns:
+            List of tool_result dicts, empty if no tool_use blocks found
+        """
+        blocks = self._tool_use_blocks(response)
+        if not blocks:
+            return []
+
+        results = [None] * len(blocks)
+        await asyncio.gather(*(
+            asyncio.to_thread(self._run_tool_group, tool_manager, blocks, group, results)
+            for group in self._group_by_tool(blocks)
+        ))
+
+        return self._build_tool_results(blocks, results)
+
+    def _tool_use_blocks(self, response) -> list:
+        """Collect tool_use blocks in a single pass over the response content"""
+        return [block for block in response.content if getattr(block, "type", None) == "tool_use"]
+
+    def _group_by_tool(self, blocks: list) -> List[List[int]]:
+        """Group block indices by tool name, keeping block order within each group"""
+        groups: Dict[str, List[int]] = {}
+        for index, block in enumerate(blocks):
+            groups.setdefault(block.name, []).append(index)
+        return list(groups.values())
+
+    def _run_tool_group(self, tool_manager, blocks: list, indices: List[int], results: list):
+        """Run one tool's calls sequentially, storing outputs at their block positions"""
+        for index in indices:
+            block = blocks[index]
+            results[index] = tool_manager.execute_tool(block.name, **block.input)
+
+    def _build_tool_results(self, blocks: list, results: list) -> list:
+        """Pair tool_use blocks with their outputs as tool_result dicts"""
+        return [
+            {"type": "tool_result", "tool_use_id": block.id, "content": result}
+            for block, result in zip(blocks, results)
+        ]
\ No newline at end of file
@@ -1,4 +1,5 @@
 from typing import List, Tuple, Optional, Dict
+import asyncio
 import os
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
@@ -27,6 +28,7 @@ class RAGSystem:
         
         # Initialize search tools
         self.tool_manager = ToolManager()
+        # Queries run on forked copies of these tools, so last_sources here stays empty
         self.search_tool = CourseSearchTool(self.vector_store)
         self.tool_manager.register_tool(self.search_tool)
         self.outline_tool = CourseOutlineTool(self.vector_store)
@@ -118,41 +120,72 @@ class RAGSystem:
         Returns:
             Tuple of (response, sources list - empty for tool-based approach)
         """
+        # Per-request tools so concurrent queries never share tracked sources
+        tool_manager = self.tool_manager.fork()
+
         if self.ai_generator is None:
             # Demo mode: search directly, return raw results
-            search_result = self.tool_manager.execute_tool(
+            search_result = tool_manager.execute_tool(
                 "search_course_content", query=query
             )
-            sources = self.tool_manager.get_last_sources()
-            self.tool_manager.reset_sources()
             response = f"**[Demo Mode]** Here are the relevant course materials:\n\n{search_result}"
         else:
-            # Create prompt for the AI with clear instructions
-            prompt = f"""Answer this question about course materials: {query}"""
-
-            # Get conversation history if session exists
-            history = None
-            if session_id:
-                history = self.session_manager.get_conversation_history(session_id)
-
             # Generate response using AI with tools
             response = self.ai_generator.generate_response(
-                query=prompt,
-                conversation_history=history,
-                tools=self.tool_manager.get_tool_definitions(),
-                tool_manager=self.tool_manager
+                **self._generation_args(query, session_id, tool_manager)
             )
 
-            # Get sources from the search tool
-            sources = self.tool_manager.get_last_sources()
+        return self._finish_query(query, session_id, response, tool_manager)
+
+    async def aquery(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[str]]:
+        """
+        Async variant of query() that awaits the AI generator instead of
+        blocking the event loop for the duration of the Claude round-trips.
+
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
+
+        Returns:
+            Tuple of (response, sources list - empty for tool-based approach)
+        """
+        if self.ai_generator is None:
+            # Demo mode has no API round-trips; run the local search off the event loop
+            return await asyncio.to_thread(self.query, query, session_id)
+
+        tool_manager = self.tool_manager.fork()
+        response = await self.ai_generator.agenerate_response(
+            **self._generation_args(query, session_id, tool_manager)
+        )
+        return self._finish_query(query, session_id, response, tool_manager)
+
+    def _generation_args(self, query: str, session_id: Optional[str], tool_manager: ToolManager) -> Dict:
+        """Build the AI generator arguments shared by query() and aquery()"""
+        # Create prompt for the AI with clear instructions
+        prompt = f"""Answer this question about course materials: {query}"""
+
+        # Get conversation history if session exists
+        history = None
+        if session_id:
+            history = self.session_manager.get_conversation_history(session_id)
+
+        return {
+            "query": prompt,
+            "conversation_history": history,
+            "tools": tool_manager.get_tool_definitions(),
+            "tool_manager": tool_manager,
+        }
+
+    def _finish_query(self, query: str, session_id: Optional[str], response: str,
+                      tool_manager: ToolManager) -> Tuple[str, List[str]]:
+        """Collect the request's sources and record the exchange in the session"""
+        # Get sources from the search tool
+        sources = tool_manager.get_last_sources()
 
-            # Reset sources after retrieving them
-            self.tool_manager.reset_sources()
-        
         # Update conversation history
         if session_id:
             self.session_manager.add_exchange(session_id, query, response)
-        
+
         # Return response with sources from tool searches
         return response, sources
     
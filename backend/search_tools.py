@@ -1,4 +1,5 @@
 from typing import Dict, Any, Optional, Protocol
+import copy
 from abc import ABC, abstractmethod
 from vector_store import VectorStore, SearchResults
 
@@ -164,6 +165,7 @@ class ToolManager:
     
     def __init__(self):
         self.tools = {}
+        self._tool_definitions = None  # Built on first use, cleared on registration
     
     def register_tool(self, tool: Tool):
         """Register any tool that implements the Tool interface"""
@@ -172,12 +174,25 @@ class ToolManager:
         if not tool_name:
             raise ValueError("Tool must have a 'name' in its definition")
         self.tools[tool_name] = tool
+        self._tool_definitions = None
 
     
     def get_tool_definitions(self) -> list:
         """Get all tool definitions for Anthropic tool calling"""
-        return [tool.get_tool_definition() for tool in self.tools.values()]
+        # Definitions are static per tool, so the same list is returned on every query
+        if self._tool_definitions is None:
+            self._tool_definitions = [tool.get_tool_definition() for tool in self.tools.values()]
+        return self._tool_definitions
     
+    def fork(self) -> "ToolManager":
+        """Copy this manager with its own tool instances so per-request sources stay isolated"""
+        forked = ToolManager()
+        forked.tools = {name: copy.copy(tool) for name, tool in self.tools.items()}
+        # Filling the parent cache here lets every fork share one definitions list
+        forked._tool_definitions = self.get_tool_definitions()
+        forked.reset_sources()
+        return forked
+
     def execute_tool(self, tool_name: str, **kwargs) -> str:
         """Execute a tool by name with given parameters"""
         if tool_name not in self.tools:
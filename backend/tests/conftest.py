@@ -19,20 +19,46 @@ from helpers import make_text_response
 # VectorStore mock
 # ---------------------------------------------------------------------------
 
+# Default search results; shared read-only, since tools only format them
+CANONICAL_RESULTS = SearchResults(
+    documents=["Chunk A text", "Chunk B text"],
+    metadata=[
+        {"course_title": "Intro to AI", "lesson_number": 1},
+        {"course_title": "Intro to AI", "lesson_number": 2},
+    ],
+    distances=[0.1, 0.2],
+)
+
+
+class FakeVectorStore:
+    """Plain stand-in for VectorStore; only search() is a mock, for call assertions."""
+
+    LESSON_LINK = "https://example.com/lesson"
+
+    def __init__(self):
+        self.search = MagicMock()
+        self.reset()
+
+    def reset(self):
+        """Clear recorded search calls and restore the default results."""
+        self.search.reset_mock()
+        self.search.return_value = CANONICAL_RESULTS
+
+    def get_lesson_link(self, course_title: str, lesson_number: int) -> str:
+        return self.LESSON_LINK
+
+
+@pytest.fixture(scope="session")
+def _shared_vector_store():
+    """The one FakeVectorStore behind mock_vector_store."""
+    return FakeVectorStore()
+
+
 @pytest.fixture
-def mock_vector_store():
-    """A MagicMock standing in for VectorStore with sensible defaults."""
-    store = MagicMock()
-    store.search.return_value = SearchResults(
-        documents=["Chunk A text", "Chunk B text"],
-        metadata=[
-            {"course_title": "Intro to AI", "lesson_number": 1},
-            {"course_title": "Intro to AI", "lesson_number": 2},
-        ],
-        distances=[0.1, 0.2],
-    )
-    store.get_lesson_link.return_value = "https://example.com/lesson"
-    return store
+def mock_vector_store(_shared_vector_store):
+    """A FakeVectorStore with sensible defaults, reset for each test that uses it."""
+    _shared_vector_store.reset()
+    return _shared_vector_store
 
 
 # ---------------------------------------------------------------------------
@@ -45,14 +71,21 @@ def search_tool(mock_vector_store):
     return CourseSearchTool(mock_vector_store)
 
 
-@pytest.fixture
-def tool_manager(mock_vector_store):
-    """A ToolManager with a CourseSearchTool registered."""
+@pytest.fixture(scope="session")
+def _shared_tool_manager(_shared_vector_store):
+    """The one ToolManager behind tool_manager, built once per session."""
     tm = ToolManager()
-    tm.register_tool(CourseSearchTool(mock_vector_store))
+    tm.register_tool(CourseSearchTool(_shared_vector_store))
     return tm
 
 
+@pytest.fixture
+def tool_manager(_shared_tool_manager, mock_vector_store):
+    """A ToolManager with a CourseSearchTool registered, its sources reset for each test."""
+    _shared_tool_manager.reset_sources()
+    return _shared_tool_manager
+
+
 # ---------------------------------------------------------------------------
 # Anthropic client mock
 # ---------------------------------------------------------------------------
@@ -30,6 +30,18 @@ def make_text_response(text: str, stop_reason: str = "end_turn"):
     return resp
 
 
+def make_stream(response, chunks: list = None):
+    """Build a fake messages.stream() context manager for a final response."""
+    stream = MagicMock()
+    stream.text_stream = chunks if chunks is not None else [
+        block.text for block in response.content if block.type == "text"
+    ]
+    stream.get_final_message.return_value = response
+    manager = MagicMock()
+    manager.__enter__.return_value = stream
+    return manager
+
+
 def make_tool_use_response(tool_name: str = "search_course_content",
                            tool_input: dict = None,
                            tool_id: str = "call_123"):
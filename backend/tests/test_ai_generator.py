@@ -1,18 +1,54 @@
 """Tests for AIGenerator tool-calling flow."""
 
-from unittest.mock import MagicMock, patch
-from helpers import make_text_response, make_tool_use_response
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from helpers import (
+    TextBlock, ToolUseBlock, make_stream, make_text_response, make_tool_use_response,
+)
 
 from ai_generator import AIGenerator
 
 
-def _make_generator(mock_client):
+def _make_generator(mock_client, **kwargs):
     """Build an AIGenerator with the Anthropic client already replaced."""
-    with patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
-        gen = AIGenerator(api_key="fake-key", model="claude-test")
+    with patch.dict("ai_generator._CLIENT_CACHE", clear=True), \
+         patch.dict("ai_generator._ASYNC_CLIENT_CACHE", clear=True), \
+         patch("ai_generator.anthropic.Anthropic", return_value=mock_client):
+        gen = AIGenerator(api_key="fake-key", model="claude-test", **kwargs)
     return gen
 
 
+class TestAIGeneratorClient:
+    """Anthropic client construction and reuse."""
+
+    def test_client_shared_across_generators(self):
+        """Generators built with the same API key reuse one Anthropic client."""
+        with patch.dict("ai_generator._CLIENT_CACHE", clear=True), \
+             patch.dict("ai_generator._ASYNC_CLIENT_CACHE", clear=True), \
+             patch("ai_generator.anthropic.Anthropic") as MockAnthropic:
+            first = AIGenerator(api_key="fake-key", model="claude-test")
+            second = AIGenerator(api_key="fake-key", model="claude-test")
+            AIGenerator(api_key="other-key", model="claude-test")
+
+        assert first.client is second.client
+        # One client per distinct API key
+        assert MockAnthropic.call_count == 2
+
+    def test_async_client_shared_across_generators(self):
+        """Generators built with the same API key reuse one AsyncAnthropic client."""
+        with patch.dict("ai_generator._CLIENT_CACHE", clear=True), \
+             patch.dict("ai_generator._ASYNC_CLIENT_CACHE", clear=True), \
+             patch("ai_generator.anthropic.Anthropic"), \
+             patch("ai_generator.anthropic.AsyncAnthropic") as MockAsyncAnthropic:
+            first = AIGenerator(api_key="fake-key", model="claude-test")
+            second = AIGenerator(api_key="fake-key", model="claude-test")
+
+        assert first.aclient is second.aclient
+        MockAsyncAnthropic.assert_called_once_with(api_key="fake-key")
+
+
 class TestAIGeneratorDirectResponse:
     """When Claude returns text without tool use."""
 
@@ -36,16 +72,30 @@ class TestAIGeneratorDirectResponse:
         assert api_call.kwargs["tools"] == tools
         assert api_call.kwargs["tool_choice"] == {"type": "auto"}
 
-    def test_conversation_history_in_system(self, mock_anthropic_client):
-        """Conversation history is appended to the system prompt."""
+    def test_conversation_history_in_first_message(self, mock_anthropic_client):
+        """Conversation history precedes the query in the first user message."""
         gen = _make_generator(mock_anthropic_client)
         history = "User: Hi\nAssistant: Hello!"
 
         gen.generate_response(query="test", conversation_history=history)
 
         api_call = mock_anthropic_client.messages.create.call_args
-        assert "Previous conversation:" in api_call.kwargs["system"]
-        assert history in api_call.kwargs["system"]
+        history_block, query_block = api_call.kwargs["messages"][0]["content"]
+        assert "Previous conversation:" in history_block["text"]
+        assert history in history_block["text"]
+        assert query_block["text"] == "test"
+        # System prompt is unchanged by history
+        assert len(api_call.kwargs["system"]) == 1
+
+    def test_system_prompt_marked_for_caching(self, mock_anthropic_client):
+        """The static system prompt is sent as an ephemeral cache block."""
+        gen = _make_generator(mock_anthropic_client)
+
+        gen.generate_response(query="test")
+
+        system = mock_anthropic_client.messages.create.call_args.kwargs["system"]
+        assert system[0]["text"] == AIGenerator.SYSTEM_PROMPT
+        assert system[0]["cache_control"] == {"type": "ephemeral"}
 
 
 class TestAIGeneratorToolUse:
@@ -176,6 +226,23 @@ class TestMultiToolRounds:
         assert messages[4]["role"] == "user"
         assert messages[4]["content"][0]["tool_use_id"] == "call_2"
 
+    def test_cache_breakpoint_on_latest_tool_result(self, mock_anthropic_client):
+        """Only the newest tool_result carries cache_control across rounds."""
+        mock_anthropic_client.messages.create.side_effect = [
+            make_tool_use_response(tool_id="call_1"),
+            make_tool_use_response(tool_id="call_2"),
+            make_text_response("done"),
+        ]
+        gen = _make_generator(mock_anthropic_client)
+        tool_mgr = MagicMock()
+        tool_mgr.execute_tool.return_value = "r"
+
+        gen.generate_response(query="q", tools=[{"name": "t"}], tool_manager=tool_mgr)
+
+        messages = mock_anthropic_client.messages.create.call_args_list[2].kwargs["messages"]
+        assert "cache_control" not in messages[2]["content"][-1]
+        assert messages[4]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+
     def test_tools_included_in_all_api_calls(self, mock_anthropic_client):
         """Tool definitions are present in every API call during the loop."""
         mock_anthropic_client.messages.create.side_effect = [
@@ -192,10 +259,26 @@ class TestMultiToolRounds:
         for i, api_call in enumerate(mock_anthropic_client.messages.create.call_args_list):
             assert "tools" in api_call.kwargs, f"API call {i} missing tools"
 
+    def test_final_call_keeps_tool_choice(self, mock_anthropic_client):
+        """tool_choice is unchanged across rounds, so the final call can reuse the cached prefix."""
+        mock_anthropic_client.messages.create.side_effect = [
+            make_tool_use_response(tool_id="call_1"),
+            make_tool_use_response(tool_id="call_2"),
+            make_text_response("done"),
+        ]
+        gen = _make_generator(mock_anthropic_client)
+        tool_mgr = MagicMock()
+        tool_mgr.execute_tool.return_value = "r"
+
+        gen.generate_response(query="q", tools=[{"name": "t"}], tool_manager=tool_mgr)
+
+        tool_choices = [c.kwargs["tool_choice"]
+                        for c in mock_anthropic_client.messages.create.call_args_list]
+        assert tool_choices == [{"type": "auto"}] * 3
+
     def test_loop_stops_at_max_rounds(self, mock_anthropic_client):
         """After MAX_TOOL_ROUNDS tool executions, the loop exits even if Claude wants more."""
         # 3 responses: initial + 2 follow-ups. The 3rd is a tool_use that won't be executed.
-        from helpers import TextBlock, ToolUseBlock
         third_resp = MagicMock()
         third_resp.stop_reason = "tool_use"
         third_resp.content = [
@@ -240,7 +323,6 @@ class TestMultiToolRounds:
 
     def test_no_tool_manager_skips_tool_execution(self, mock_anthropic_client):
         """When tool_manager is None, tool_use response text is returned directly."""
-        from helpers import TextBlock, ToolUseBlock
         resp = MagicMock()
         resp.stop_reason = "tool_use"
         resp.content = [
@@ -258,6 +340,60 @@ class TestMultiToolRounds:
         assert mock_anthropic_client.messages.create.call_count == 1
         assert result == "I want to search"
 
+    def test_same_tool_calls_run_in_block_order(self, mock_anthropic_client):
+        """Repeated calls to one tool run sequentially, so the last block's state wins."""
+        resp = MagicMock()
+        resp.stop_reason = "tool_use"
+        resp.content = [
+            ToolUseBlock(id="call_1", name="search_course_content", input={"query": "first"}),
+            ToolUseBlock(id="call_2", name="search_course_content", input={"query": "second"}),
+        ]
+        mock_anthropic_client.messages.create.side_effect = [
+            resp, make_text_response("answer"),
+        ]
+        gen = _make_generator(mock_anthropic_client)
+        executed = []
+
+        def slow_first(name, query):
+            # Run concurrently, "second" would finish before "first"
+            if query == "first":
+                time.sleep(0.05)
+            executed.append(query)
+            return query
+
+        tool_mgr = MagicMock()
+        tool_mgr.execute_tool.side_effect = slow_first
+
+        gen.generate_response(query="q", tools=[{"name": "t"}], tool_manager=tool_mgr)
+
+        assert executed == ["first", "second"]
+
+    def test_parallel_tool_calls_keep_block_order(self, mock_anthropic_client):
+        """Multiple tool_use blocks in one turn all run, with results in block order."""
+        resp = MagicMock()
+        resp.stop_reason = "tool_use"
+        resp.content = [
+            ToolUseBlock(id="call_a", name="get_course_outline",
+                         input={"course_name": "MCP"}),
+            ToolUseBlock(id="call_b", name="search_course_content",
+                         input={"query": "servers"}),
+        ]
+        mock_anthropic_client.messages.create.side_effect = [
+            resp, make_text_response("answer"),
+        ]
+        gen = _make_generator(mock_anthropic_client)
+        tool_mgr = MagicMock()
+        tool_mgr.execute_tool.side_effect = lambda name, **kwargs: f"{name} output"
+
+        gen.generate_response(query="q", tools=[{"name": "t"}], tool_manager=tool_mgr)
+
+        assert tool_mgr.execute_tool.call_count == 2
+        tool_results = mock_anthropic_client.messages.create.call_args_list[1].kwargs["messages"][-1]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["call_a", "call_b"]
+        assert [r["content"] for r in tool_results] == [
+            "get_course_outline output", "search_course_content output",
+        ]
+
     def test_tool_error_string_sent_back_to_claude(self, mock_anthropic_client):
         """Tool error strings are passed to Claude as tool_result content."""
         mock_anthropic_client.messages.create.side_effect = [
@@ -279,7 +415,6 @@ class TestMultiToolRounds:
 
     def test_fallback_when_no_text_block(self, mock_anthropic_client):
         """Returns fallback message when the final response has no text block."""
-        from helpers import ToolUseBlock
         # All 3 responses are tool_use with no text blocks
         def _tool_only(call_id):
             resp = MagicMock()
@@ -303,3 +438,208 @@ class TestMultiToolRounds:
         )
 
         assert "try rephrasing" in result
+
+
+class TestAsyncGenerateResponse:
+    """agenerate_response mirrors generate_response on the async client."""
+
+    def test_async_tool_round_trip(self, mock_anthropic_client):
+        """Async flow awaits each API call and runs tools between rounds."""
+        gen = _make_generator(mock_anthropic_client)
+        gen.aclient = MagicMock()
+        gen.aclient.messages.create = AsyncMock(side_effect=[
+            make_tool_use_response(tool_id="call_1", tool_input={"query": "MCP"}),
+            make_text_response("async answer"),
+        ])
+        tool_mgr = MagicMock()
+        tool_mgr.execute_tool.return_value = "search results"
+
+        result = asyncio.run(gen.agenerate_response(
+            query="q", tools=[{"name": "t"}], tool_manager=tool_mgr,
+        ))
+
+        assert result == "async answer"
+        assert gen.aclient.messages.create.await_count == 2
+        tool_mgr.execute_tool.assert_called_once_with("search_course_content", query="MCP")
+        messages = gen.aclient.messages.create.call_args.kwargs["messages"]
+        assert messages[-1]["content"][0]["tool_use_id"] == "call_1"
+        mock_anthropic_client.messages.create.assert_not_called()
+
+
+class TestStreamResponse:
+    """stream_response yields text chunks while running the same tool loop."""
+
+    def test_stream_yields_text_chunks(self, mock_anthropic_client):
+        """Text deltas from a direct answer are yielded in order."""
+        mock_anthropic_client.messages.stream.return_value = make_stream(
+            make_text_response("Hello world"), chunks=["Hello", " world"]
+        )
+        gen = _make_generator(mock_anthropic_client)
+
+        chunks = list(gen.stream_response(query="q"))
+
+        assert chunks == ["Hello", " world"]
+        mock_anthropic_client.messages.create.assert_not_called()
+
+    def test_stream_runs_tools_before_final_answer(self, mock_anthropic_client):
+        """A tool_use turn executes tools, then the follow-up call is streamed."""
+        mock_anthropic_client.messages.stream.side_effect = [
+            make_stream(make_tool_use_response(tool_id="call_1")),
+            make_stream(make_text_response("final"), chunks=["fin", "al"]),
+        ]
+        gen = _make_generator(mock_anthropic_client)
+        tool_mgr = MagicMock()
+        tool_mgr.execute_tool.return_value = "results"
+
+        chunks = list(gen.stream_response(
+            query="q", tools=[{"name": "t"}], tool_manager=tool_mgr,
+        ))
+
+        assert "".join(chunks) == "final"
+        tool_mgr.execute_tool.assert_called_once()
+        second_call = mock_anthropic_client.messages.stream.call_args_list[1]
+        assert second_call.kwargs["messages"][-1]["content"][0]["tool_use_id"] == "call_1"
+
+    def test_stream_separates_tool_turn_preamble(self, mock_anthropic_client):
+        """Text from a tool_use turn is streamed, then a separator before the answer."""
+        tool_turn = MagicMock()
+        tool_turn.stop_reason = "tool_use"
+        tool_turn.content = [
+            TextBlock(text="Let me search."),
+            ToolUseBlock(id="call_1", name="search_course_content", input={"query": "x"}),
+        ]
+        mock_anthropic_client.messages.stream.side_effect = [
+            make_stream(tool_turn),
+            make_stream(make_text_response("The answer."), chunks=["The ", "answer."]),
+        ]
+        gen = _make_generator(mock_anthropic_client)
+        tool_mgr = MagicMock()
+        tool_mgr.execute_tool.return_value = "results"
+
+        chunks = list(gen.stream_response(
+            query="q", tools=[{"name": "t"}], tool_manager=tool_mgr,
+        ))
+
+        assert "".join(chunks) == "Let me search." + AIGenerator.STREAM_TURN_SEPARATOR + "The answer."
+
+    def test_stream_stops_at_max_rounds(self, mock_anthropic_client):
+        """No more than MAX_TOOL_ROUNDS tool executions happen while streaming."""
+        mock_anthropic_client.messages.stream.side_effect = [
+            make_stream(make_tool_use_response(tool_id=f"call_{i}"))
+            for i in range(AIGenerator.MAX_TOOL_ROUNDS + 1)
+        ]
+        gen = _make_generator(mock_anthropic_client)
+        tool_mgr = MagicMock()
+        tool_mgr.execute_tool.return_value = "r"
+
+        list(gen.stream_response(query="q", tools=[{"name": "t"}], tool_manager=tool_mgr))
+
+        assert mock_anthropic_client.messages.stream.call_count == AIGenerator.MAX_TOOL_ROUNDS + 1
+        assert tool_mgr.execute_tool.call_count == AIGenerator.MAX_TOOL_ROUNDS
+
+
+class TestGenerateBatch:
+    """generate_batch submits independent queries together."""
+
+    def test_batch_api_results_in_query_order(self, mock_anthropic_client):
+        """Batch results are mapped back to queries by custom_id."""
+        batches = mock_anthropic_client.messages.batches
+        batches.create.return_value = MagicMock(id="batch_1", processing_status="in_progress")
+        batches.retrieve.return_value = MagicMock(id="batch_1", processing_status="ended")
+
+        def _entry(custom_id, text=None):
+            entry = MagicMock(custom_id=custom_id)
+            entry.result.type = "succeeded" if text else "errored"
+            entry.result.message = make_text_response(text or "")
+            return entry
+
+        batches.results.return_value = [_entry("1", "second"), _entry("2"), _entry("0", "first")]
+        gen = _make_generator(mock_anthropic_client)
+
+        with patch("ai_generator.time.sleep") as mock_sleep:
+            results = gen.generate_batch(["q0", "q1", "q2"])
+
+        assert results == ["first", "second", AIGenerator.FALLBACK_RESPONSE]
+        mock_sleep.assert_called_once_with(AIGenerator.BATCH_POLL_INTERVAL)
+        requests = batches.create.call_args.kwargs["requests"]
+        assert [r["custom_id"] for r in requests] == ["0", "1", "2"]
+        assert requests[1]["params"]["messages"] == [{"role": "user", "content": "q1"}]
+        assert "tools" not in requests[1]["params"]
+        mock_anthropic_client.messages.create.assert_not_called()
+
+    def test_batch_cancelled_after_max_wait(self, mock_anthropic_client):
+        """A batch still processing at the deadline is cancelled and raises."""
+        batches = mock_anthropic_client.messages.batches
+        batches.create.return_value = MagicMock(id="batch_1", processing_status="in_progress")
+        batches.retrieve.return_value = MagicMock(id="batch_1", processing_status="in_progress")
+        gen = _make_generator(mock_anthropic_client)
+
+        with patch("ai_generator.time.sleep") as mock_sleep, \
+                patch("ai_generator.time.monotonic", side_effect=[0, 0, 5, 10]):
+            with pytest.raises(TimeoutError):
+                gen.generate_batch(["q0"], max_wait=10)
+
+        assert mock_sleep.call_count == 2
+        batches.cancel.assert_called_once_with("batch_1")
+        batches.results.assert_not_called()
+
+    def test_tool_manager_falls_back_to_generate_response(self, mock_anthropic_client):
+        """With a tool_manager, each query runs the normal tool loop."""
+        gen = _make_generator(mock_anthropic_client)
+        tool_mgr = MagicMock()
+
+        results = gen.generate_batch(["a", "b"], tools=[{"name": "t"}], tool_manager=tool_mgr)
+
+        assert results == ["Hello from Claude", "Hello from Claude"]
+        assert mock_anthropic_client.messages.create.call_count == 2
+        # Each query gets its own fork, leaving the caller's manager untouched
+        assert tool_mgr.fork.call_count == 2
+        mock_anthropic_client.messages.batches.create.assert_not_called()
+
+
+class TestResponseCache:
+    """Identical tool-free requests are served from the local LRU cache."""
+
+    def test_repeated_query_served_from_cache(self, mock_anthropic_client):
+        """A second identical call returns the cached answer without an API call."""
+        gen = _make_generator(mock_anthropic_client)
+
+        first = gen.generate_response(query="q", conversation_history="h")
+        second = gen.generate_response(query="q", conversation_history="h")
+        gen.generate_response(query="q", conversation_history="other")
+
+        assert first == second == "Hello from Claude"
+        assert mock_anthropic_client.messages.create.call_count == 2
+
+    def test_tool_manager_bypasses_cache(self, mock_anthropic_client):
+        """Responses that may depend on tool output are never cached."""
+        gen = _make_generator(mock_anthropic_client)
+        tool_mgr = MagicMock()
+
+        gen.generate_response(query="q", tools=[{"name": "t"}], tool_manager=tool_mgr)
+        gen.generate_response(query="q", tools=[{"name": "t"}], tool_manager=tool_mgr)
+
+        assert mock_anthropic_client.messages.create.call_count == 2
+
+    def test_cache_disabled_by_flag(self, mock_anthropic_client):
+        """cache_responses=False always calls the API."""
+        gen = _make_generator(mock_anthropic_client, cache_responses=False)
+
+        gen.generate_response(query="q")
+        gen.generate_response(query="q")
+
+        assert mock_anthropic_client.messages.create.call_count == 2
+
+    def test_least_recently_used_entry_evicted(self, mock_anthropic_client):
+        """The cache stays bounded by evicting the oldest unused entry."""
+        gen = _make_generator(mock_anthropic_client)
+
+        with patch.object(AIGenerator, "RESPONSE_CACHE_SIZE", 2):
+            gen.generate_response(query="a")
+            gen.generate_response(query="b")
+            gen.generate_response(query="a")  # hit; "b" is now least recent
+            gen.generate_response(query="c")  # evicts "b"
+            gen.generate_response(query="a")  # still cached
+            gen.generate_response(query="b")  # miss
+
+        assert mock_anthropic_client.messages.create.call_count == 4
@@ -1,131 +1,219 @@
 """Tests for RAGSystem.query() integration."""
 
-from unittest.mock import MagicMock, patch, call
+import asyncio
+import copy
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, call, patch
+
+import pytest
+import rag_system
+from rag_system import RAGSystem
+from ai_generator import AIGenerator
+from search_tools import CourseSearchTool, ToolManager
+from vector_store import SearchResults
 from helpers import make_text_response, make_tool_use_response
 
 
-class TestRAGSystemQuery:
+# Heavy classes imported by rag_system.py, replaced while templates are built
+STUBBED_DEPENDENCIES = (
+    "DocumentProcessor", "VectorStore", "AIGenerator", "SessionManager",
+    "ToolManager", "CourseSearchTool", "CourseOutlineTool",
+)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stub_rag_dependencies():
+    """Swap rag_system's dependencies for MagicMocks by plain attribute assignment."""
+    saved = {name: getattr(rag_system, name) for name in STUBBED_DEPENDENCIES}
+    for name in STUBBED_DEPENDENCIES:
+        setattr(rag_system, name, MagicMock())
+    yield
+    for name, original in saved.items():
+        setattr(rag_system, name, original)
+
+
+def _build_rag(demo_mode: bool = False):
+    """Build a RAGSystem against the stubbed dependencies."""
+    # Config only holds values, so a plain namespace is enough
+    config = SimpleNamespace(
+        DEMO_MODE=demo_mode,
+        ANTHROPIC_API_KEY="fake-key",
+        ANTHROPIC_MODEL="claude-test",
+        CHUNK_SIZE=800,
+        CHUNK_OVERLAP=100,
+        CHROMA_PATH="./test_db",
+        EMBEDDING_MODEL="test-model",
+        MAX_RESULTS=5,
+        MAX_HISTORY=2,
+    )
+    return RAGSystem(config)
+
+
+# Components _copy_rag replaces, so no mock is shared between copies
+COPIED_COMPONENTS = (
+    "document_processor", "vector_store", "session_manager", "search_tool", "outline_tool",
+)
+
+
+def _copy_rag(template, answer=None):
+    """
+    Shallow-copy a template RAGSystem with a fresh mock for every component.
+
+    When answer is given, the AI generator is a plain stub returning it, for
+    tests that never inspect how the generator was called.
+    """
+    rag = copy.copy(template)
+    rag.tool_manager = MagicMock()
+    # query() works on a per-request fork; reusing the mock keeps assertions on one object
+    rag.tool_manager.fork.return_value = rag.tool_manager
+    for name in COPIED_COMPONENTS:
+        setattr(rag, name, MagicMock())
+    if template.ai_generator is not None:
+        if answer is None:
+            rag.ai_generator = MagicMock()
+        else:
+            rag.ai_generator = SimpleNamespace(generate_response=lambda *args, **kwargs: answer)
+    return rag
+
+
+# Module scope builds once per worker too, since --dist=loadfile keeps this file together
+@pytest.fixture(scope="module")
+def rag_template(stub_rag_dependencies):
+    """A RAGSystem built once per module with stubbed dependencies."""
+    return _build_rag()
+
+
+@pytest.fixture(scope="module")
+def demo_rag_template(stub_rag_dependencies):
+    """A demo-mode RAGSystem built once per module with stubbed dependencies."""
+    return _build_rag(demo_mode=True)
+
+
+class RAGSystemTestBase:
+    """Gives test classes _make_rag() backed by the shared templates."""
+
+    @pytest.fixture(autouse=True)
+    def _bind_templates(self, rag_template, demo_rag_template):
+        self.rag_template = rag_template
+        self.demo_rag_template = demo_rag_template
+
+    def _make_rag(self, demo_mode: bool = False, answer=None):
+        """Copy the shared (optionally demo-mode) RAGSystem template with fresh component mocks."""
+        return _copy_rag(self.demo_rag_template if demo_mode else self.rag_template, answer)
+
+
+class TestRAGSystemQuery(RAGSystemTestBase):
     """Tests for RAGSystem.query() with mocked components."""
 
-    def _make_rag(self):
-        """Build a RAGSystem with all heavy dependencies mocked out."""
-        # Patch the imports used inside rag_system.py
-        with patch("rag_system.DocumentProcessor"), \
-             patch("rag_system.VectorStore") as MockVS, \
-             patch("rag_system.AIGenerator") as MockAI, \
-             patch("rag_system.SessionManager") as MockSM, \
-             patch("rag_system.ToolManager") as MockTM, \
-             patch("rag_system.CourseSearchTool") as MockCST, \
-             patch("rag_system.CourseOutlineTool") as MockCOT:
-
-            # Configure mock config
-            config = MagicMock()
-            config.DEMO_MODE = False
-            config.ANTHROPIC_API_KEY = "fake-key"
-            config.ANTHROPIC_MODEL = "claude-test"
-            config.CHUNK_SIZE = 800
-            config.CHUNK_OVERLAP = 100
-            config.CHROMA_PATH = "./test_db"
-            config.EMBEDDING_MODEL = "test-model"
-            config.MAX_RESULTS = 5
-            config.MAX_HISTORY = 2
-
-            from rag_system import RAGSystem
-            rag = RAGSystem(config)
-
-        return rag
-
-    def test_query_passes_tools_to_generator(self):
-        """query() passes tool definitions and tool_manager to AI generator."""
+    def test_query_happy_path(self):
+        """One query() call wires tools, sources and session history through."""
         rag = self._make_rag()
         rag.tool_manager.get_tool_definitions.return_value = [{"name": "search"}]
-        rag.tool_manager.get_last_sources.return_value = []
-        rag.ai_generator.generate_response.return_value = "answer"
+        expected_sources = [{"text": "Course A", "link": "http://a"}]
+        rag.tool_manager.get_last_sources.return_value = expected_sources
+        rag.ai_generator.generate_response.return_value = "the answer"
 
-        rag.query("What is AI?", session_id="s1")
+        response, sources = rag.query("my question", session_id="sess1")
 
+        # Tool definitions and tool_manager are passed to the AI generator
         call_kwargs = rag.ai_generator.generate_response.call_args.kwargs
         assert call_kwargs["tools"] == [{"name": "search"}]
         assert call_kwargs["tool_manager"] is rag.tool_manager
 
-    def test_query_returns_response_and_sources(self):
-        """Return value is (response_string, sources_list)."""
-        rag = self._make_rag()
-        rag.ai_generator.generate_response.return_value = "The answer"
-        rag.tool_manager.get_last_sources.return_value = [
-            {"text": "Course A", "link": "http://a"}
-        ]
+        # Return value is (response_string, sources_list)
+        assert response == "the answer"
+        assert sources is expected_sources
 
-        response, sources = rag.query("question")
+        # Sources are collected once from a per-request fork
+        rag.tool_manager.fork.assert_called_once_with()
+        rag.tool_manager.get_last_sources.assert_called_once()
 
-        assert response == "The answer"
-        assert sources == [{"text": "Course A", "link": "http://a"}]
+        # The exchange is recorded for the session
+        rag.session_manager.add_exchange.assert_called_once_with(
+            "sess1", "my question", "the answer"
+        )
 
-    def test_query_collects_sources_from_tool_manager(self):
-        """Sources come from tool_manager.get_last_sources()."""
+    def test_copies_do_not_share_component_mocks(self):
+        """Each copy gets its own mocks, so tests can run in any order or worker."""
         rag = self._make_rag()
-        rag.ai_generator.generate_response.return_value = "resp"
-        expected_sources = [{"text": "src", "link": None}]
-        rag.tool_manager.get_last_sources.return_value = expected_sources
 
-        _, sources = rag.query("q")
+        other = self._make_rag()
 
-        rag.tool_manager.get_last_sources.assert_called_once()
-        assert sources is expected_sources
+        for name in ("tool_manager", "ai_generator") + COPIED_COMPONENTS:
+            assert getattr(rag, name) is not getattr(self.rag_template, name), name
+            assert getattr(rag, name) is not getattr(other, name), name
 
-    def test_query_resets_sources_after_retrieval(self):
-        """tool_manager.reset_sources() is called after getting sources."""
-        rag = self._make_rag()
-        rag.ai_generator.generate_response.return_value = "resp"
+    def test_query_no_session_skips_history_update(self):
+        """When no session_id is provided, session manager is not called."""
+        rag = self._make_rag(answer="resp")
         rag.tool_manager.get_last_sources.return_value = []
 
-        rag.query("q")
+        rag.query("q", session_id=None)
 
-        rag.tool_manager.reset_sources.assert_called_once()
+        rag.session_manager.add_exchange.assert_not_called()
 
-    def test_query_updates_session_history(self):
-        """Session manager gets the exchange added when session_id is provided."""
+    def test_aquery_awaits_async_generator(self):
+        """aquery() awaits agenerate_response and updates sources and history."""
         rag = self._make_rag()
-        rag.ai_generator.generate_response.return_value = "the answer"
-        rag.tool_manager.get_last_sources.return_value = []
+        rag.ai_generator.agenerate_response = AsyncMock(return_value="async answer")
+        rag.tool_manager.get_last_sources.return_value = [{"text": "src", "link": None}]
 
-        rag.query("my question", session_id="sess1")
+        response, sources = asyncio.run(rag.aquery("my question", session_id="sess1"))
 
+        assert response == "async answer"
+        assert sources == [{"text": "src", "link": None}]
+        rag.ai_generator.generate_response.assert_not_called()
+        rag.tool_manager.fork.assert_called_once_with()
         rag.session_manager.add_exchange.assert_called_once_with(
-            "sess1", "my question", "the answer"
+            "sess1", "my question", "async answer"
         )
 
-    def test_query_no_session_skips_history_update(self):
-        """When no session_id is provided, session manager is not called."""
+    def test_concurrent_aqueries_keep_their_own_sources(self):
+        """Interleaved aquery() calls each get the sources from their own searches."""
+        store = MagicMock()
+        store.search.side_effect = lambda query, **kwargs: SearchResults(
+            documents=[f"{query} text"],
+            metadata=[{"course_title": query, "lesson_number": 1}],
+            distances=[0.1],
+        )
+        store.get_lesson_link.return_value = None
         rag = self._make_rag()
-        rag.ai_generator.generate_response.return_value = "resp"
-        rag.tool_manager.get_last_sources.return_value = []
+        rag.tool_manager = ToolManager()
+        rag.tool_manager.register_tool(CourseSearchTool(store))
 
-        rag.query("q", session_id=None)
+        with patch.dict("ai_generator._CLIENT_CACHE", clear=True), \
+             patch.dict("ai_generator._ASYNC_CLIENT_CACHE", clear=True), \
+             patch("ai_generator.anthropic.Anthropic"), \
+             patch("ai_generator.anthropic.AsyncAnthropic"):
+            rag.ai_generator = AIGenerator(api_key="fake-key", model="claude-test")
 
-        rag.session_manager.add_exchange.assert_not_called()
+        # Both follow-up calls wait here, so both searches finish before either reads sources
+        both_searched = asyncio.Barrier(2)
+
+        async def fake_create(**params):
+            # The topic is the last word of the prompt
+            topic = params["messages"][0]["content"].rsplit(" ", 1)[-1]
+            if len(params["messages"]) == 1:
+                return make_tool_use_response(tool_id=f"call_{topic}", tool_input={"query": topic})
+            await both_searched.wait()
+            return make_text_response(f"answer {topic}")
+
+        rag.ai_generator.aclient.messages.create = AsyncMock(side_effect=fake_create)
+
+        async def run_both():
+            return await asyncio.gather(rag.aquery("A"), rag.aquery("B"))
+
+        (answer_a, sources_a), (answer_b, sources_b) = asyncio.run(run_both())
+
+        assert answer_a == "answer A"
+        assert sources_a == [{"text": "A - Lesson 1", "link": None}]
+        assert answer_b == "answer B"
+        assert sources_b == [{"text": "B - Lesson 1", "link": None}]
+        assert rag.tool_manager.get_last_sources() == []
 
     def test_query_demo_mode_bypasses_ai(self):
         """Demo mode calls tool_manager directly instead of AI generator."""
-        with patch("rag_system.DocumentProcessor"), \
-             patch("rag_system.VectorStore"), \
-             patch("rag_system.AIGenerator"), \
-             patch("rag_system.SessionManager"), \
-             patch("rag_system.ToolManager") as MockTM, \
-             patch("rag_system.CourseSearchTool"), \
-             patch("rag_system.CourseOutlineTool"):
-
-            config = MagicMock()
-            config.DEMO_MODE = True
-            config.CHUNK_SIZE = 800
-            config.CHUNK_OVERLAP = 100
-            config.CHROMA_PATH = "./test_db"
-            config.EMBEDDING_MODEL = "test-model"
-            config.MAX_RESULTS = 5
-            config.MAX_HISTORY = 2
-
-            from rag_system import RAGSystem
-            rag = RAGSystem(config)
+        rag = self._make_rag(demo_mode=True)
 
         # ai_generator should be None in demo mode
         assert rag.ai_generator is None
@@ -142,32 +230,12 @@ class TestRAGSystemQuery:
         assert "demo search results" in response
 
 
-class TestRAGSystemFullPipeline:
+class TestRAGSystemFullPipeline(RAGSystemTestBase):
     """Minimal-mocking end-to-end test through the query pipeline."""
 
     def test_full_pipeline_tool_use_flow(self):
         """End-to-end: query -> AI -> tool_use -> execute -> results -> AI -> final answer."""
-        with patch("rag_system.DocumentProcessor"), \
-             patch("rag_system.VectorStore") as MockVS, \
-             patch("rag_system.AIGenerator") as MockAI, \
-             patch("rag_system.SessionManager") as MockSM, \
-             patch("rag_system.CourseSearchTool") as MockCST, \
-             patch("rag_system.CourseOutlineTool") as MockCOT, \
-             patch("rag_system.ToolManager") as MockTM:
-
-            config = MagicMock()
-            config.DEMO_MODE = False
-            config.ANTHROPIC_API_KEY = "fake"
-            config.ANTHROPIC_MODEL = "test"
-            config.CHUNK_SIZE = 800
-            config.CHUNK_OVERLAP = 100
-            config.CHROMA_PATH = "./test_db"
-            config.EMBEDDING_MODEL = "test"
-            config.MAX_RESULTS = 5
-            config.MAX_HISTORY = 2
-
-            from rag_system import RAGSystem
-            rag = RAGSystem(config)
+        rag = self._make_rag()
 
         # Wire up the tool_manager mock
         rag.tool_manager.get_tool_definitions.return_value = [{"name": "search_course_content"}]
@@ -190,9 +258,8 @@ class TestRAGSystemFullPipeline:
         assert gen_call.kwargs["tools"] == [{"name": "search_course_content"}]
         assert gen_call.kwargs["tool_manager"] is rag.tool_manager
 
-        # Sources were collected and reset
+        # Sources were collected
         rag.tool_manager.get_last_sources.assert_called_once()
-        rag.tool_manager.reset_sources.assert_called_once()
 
         # Session was updated
         rag.session_manager.add_exchange.assert_called_once()
@@ -2,7 +2,14 @@
 
 from unittest.mock import MagicMock
 from vector_store import SearchResults
-from search_tools import CourseSearchTool, ToolManager
+from search_tools import CourseSearchTool, CourseOutlineTool, ToolManager
+
+
+# Read-only results shared by the empty/error tests
+EMPTY_RESULTS = SearchResults(documents=[], metadata=[], distances=[])
+ERROR_RESULTS = SearchResults(
+    documents=[], metadata=[], distances=[], error="Search error: timeout"
+)
 
 
 # ── CourseSearchTool.execute() ────────────────────────────────────────────
@@ -22,9 +29,7 @@ class TestCourseSearchToolExecute:
 
     def test_execute_empty_results(self, search_tool, mock_vector_store):
         """Empty results return a 'No relevant content found' message."""
-        mock_vector_store.search.return_value = SearchResults(
-            documents=[], metadata=[], distances=[]
-        )
+        mock_vector_store.search.return_value = EMPTY_RESULTS
 
         result = search_tool.execute(query="nonexistent topic")
 
@@ -32,9 +37,7 @@ class TestCourseSearchToolExecute:
 
     def test_execute_empty_results_with_filters(self, search_tool, mock_vector_store):
         """Empty results include course/lesson filter information."""
-        mock_vector_store.search.return_value = SearchResults(
-            documents=[], metadata=[], distances=[]
-        )
+        mock_vector_store.search.return_value = EMPTY_RESULTS
 
         result = search_tool.execute(
             query="nonexistent", course_name="MCP", lesson_number=3
@@ -46,9 +49,7 @@ class TestCourseSearchToolExecute:
 
     def test_execute_with_error(self, search_tool, mock_vector_store):
         """Error from vector store is returned as-is."""
-        mock_vector_store.search.return_value = SearchResults(
-            documents=[], metadata=[], distances=[], error="Search error: timeout"
-        )
+        mock_vector_store.search.return_value = ERROR_RESULTS
 
         result = search_tool.execute(query="anything")
 
@@ -89,6 +90,32 @@ class TestToolManager:
         assert len(definitions) == 1
         assert definitions[0]["name"] == "search_course_content"
 
+    def test_tool_definitions_reused_until_registration(self, mock_vector_store):
+        """get_tool_definitions returns the same list until a new tool is registered."""
+        tm = ToolManager()
+        tm.register_tool(CourseSearchTool(mock_vector_store))
+
+        first = tm.get_tool_definitions()
+        assert tm.get_tool_definitions() is first
+
+        tm.register_tool(CourseOutlineTool(mock_vector_store))
+
+        names = [d["name"] for d in tm.get_tool_definitions()]
+        assert names == ["search_course_content", "get_course_outline"]
+
+    def test_fork_isolates_sources(self, mock_vector_store):
+        """A forked ToolManager tracks sources separately from its parent."""
+        tm = ToolManager()
+        tm.register_tool(CourseSearchTool(mock_vector_store))
+
+        forked = tm.fork()
+        forked.execute_tool("search_course_content", query="test")
+
+        assert len(forked.get_last_sources()) == 2
+        assert tm.get_last_sources() == []
+        assert forked.get_tool_definitions() is tm.get_tool_definitions()
+        assert tm.fork().get_tool_definitions() is forked.get_tool_definitions()
+
     def test_tool_manager_execute_dispatches(self, tool_manager):
         """ToolManager.execute_tool dispatches to the correct tool."""
         result = tool_manager.execute_tool(